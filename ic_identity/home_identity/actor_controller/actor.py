@@ -1,306 +1,335 @@
-import os, re
-from typing import Any, List, Optional, Union
-
-from ic.canister import Canister
-from ic.candid import encode, decode, Types
+import asyncio
+import logging
+import re
+import sys
+from functools import lru_cache
+from pathlib import Path
+from typing import Any, Dict, List, NamedTuple, Optional, Union
+
+from antlr4 import CommonTokenStream, InputStream, ParseTreeWalker
+from ic.canister import Canister, CaniterMethod, CaniterMethodAsync
+from ic.parser.DIDEmitter import DIDEmitter, DIDLexer, DIDParser
+from ic.candid import encode, Types
 try:
     from ic.principal import Principal as ICPrincipal  # for isinstance checks
 except Exception:
     ICPrincipal = None  # library might not expose at import time
 
 from ..utils.parsers.subacount_parsers import transform_login_result
-from ..utils.helpers import strip_candid_comments, iter_balanced_blocks
+from ..utils.helpers import strip_candid_comments, normalize_candid_tree
 from .agent import ICAgent
 
-DECODE_ERRORS = (
-    "Cannot find field",
-    "Message length smaller",
-    "IDL error",
+logger = logging.getLogger(__name__)
+
+_DID_PATH = Path(__file__).resolve().parent.parent / "data" / "canisters" / "m_autonome_canister.did"
+
+
+# Candid encoding of an empty argument tuple; identical for every no-arg call
+_EMPTY_ARGS = encode([])
+
+
+# name : (args) -> (ret) [query]  -- one pattern for every method signature in the .did
+_METHOD_RE = re.compile(
+    r'(?:"(?P<quoted>[^"]+)"|(?P<name>[A-Za-z_]\w*))\s*:'
+    r'\s*\((?P<args>[^)]*)\)\s*->\s*\((?P<ret>[^)]*)\)\s*(?P<query>query)?',
+    re.S | re.I,
 )
 
+# label : T   |   { label ;   -- quoted or bare, see _build_field_hash_map
+_DID_LABEL_RE = re.compile(
+    r'(?:"([^"]+)"|\b([A-Za-z_][\w-]*))\s*:'
+    r'|(?<=[{;,])\s*(?:"([^"]+)"|([A-Za-z_][\w-]*))\s*(?=[;,}])'
+)
+
+
+@lru_cache(maxsize=4096)
+def _candid_hash(name: str) -> int:
+    """Candid field-id hash: foldl(h*223 + byte) mod 2^32."""
+    h = 0
+    for b in name.encode("utf-8"):
+        h = h * 223 + b
+    return h & 0xFFFFFFFF  # masking once at the end gives the same value
+
+
+_TYPE_DEF_RE = re.compile(r'\btype\s+(?:"([^"]+)"|([A-Za-z_]\w*))\s*=')
+_BODY_DELIM_RE = re.compile(r'[{};]')
+_IDENT_RE = re.compile(r'[A-Za-z_]\w*')
+
+
+class MethodInfo(NamedTuple):
+    is_query: bool
+    # What the reply can contain once type aliases are expanded; a reply with
+    # none of these needs no normalization at all.
+    has_records: bool = True
+    has_variants: bool = True
+    has_principal: bool = True
+
+
+class DidMetadata(NamedTuple):
+    source: str                       # raw .did text, handed to ic-py's Canister
+    str_key_rename: Dict[str, str]    # "_<hash>" -> name, as ic-py emits unknown fields
+    method_info: Dict[str, MethodInfo]
+    candid_actor: Dict[str, Any]      # ic-py's parsed service ({"methods": {name: FuncClass}})
+
+
+def _parse_candid_actor(source: str) -> Dict[str, Any]:
+    """The antlr parse ic-py's Canister runs in __init__; identical for every canister id."""
+    tree = DIDParser(CommonTokenStream(DIDLexer(InputStream(source)))).program()
+    emitter = DIDEmitter()
+    ParseTreeWalker().walk(emitter, tree)
+    return emitter.getActor()
+
+
+def _bind_canister(agent: Any, canister_id: str, source: str, candid_actor: Dict[str, Any]) -> Canister:
+    """
+    Equivalent of Canister(agent, canister_id, candid=source) that reuses an
+    already parsed service instead of running the antlr parser again.
+    """
+    canister = Canister.__new__(Canister)
+    canister.agent = agent
+    canister.canister_id = canister_id
+    canister.candid = source
+    canister.actor = candid_actor
+    for name, method in candid_actor["methods"].items():
+        anno = method.annotations[0] if method.annotations else None
+        setattr(canister, name, CaniterMethod(agent, canister_id, name, method.argTypes, method.retTypes, anno))
+        setattr(canister, name + "_async", CaniterMethodAsync(agent, canister_id, name, method.argTypes, method.retTypes, anno))
+    return canister
+
+
+def _build_field_hash_map(src: str) -> Dict[int, str]:
+    """
+    Scan the (comment-stripped) .did and collect ALL record field names and
+    variant labels.
+    Important: we do NOT filter out keywords like 'text'/'nat' if they appear
+    in *label positions*; Candid allows those as labels, and they hash on-wire.
+    """
+    names: set[str] = set()
+
+    # One linear scan over the whole source. Labels are either
+    #   a) anything right before ':'  (record fields, typed variant arms), or
+    #   b) a lone token at an arm boundary ({ ; ,) followed by ; , }  (unit arms).
+    # Type tokens follow a ':' rather than a boundary, so they never match (b).
+    for m in _DID_LABEL_RE.finditer(src):
+        nm = m.group(1) or m.group(2) or m.group(3) or m.group(4)
+        if nm:
+            names.add(nm)
+
+    # Common tags that sometimes aren’t explicitly present (cheap safety net)
+    names.update({"ok", "err"})
+
+    # Build hash -> name map. Names become keys of every hydrated reply, so
+    # intern them once to make later key comparisons identity checks.
+    mapping = {_candid_hash(n): sys.intern(n) for n in names}
+
+    # Helpful diagnostics (keep short)
+    text_hash = _candid_hash("text")
+    logger.debug("Built hash->name map with %d entries; includes 'text'? %s (hash=%d)",
+                 len(mapping), "yes" if text_hash in mapping else "no", text_hash)
+
+    return mapping
+
+
+def _type_definitions(did_text: str) -> Dict[str, str]:
+    """Map each `type Name = <body>;` in the .did to its body text."""
+    defs: Dict[str, str] = {}
+    for m in _TYPE_DEF_RE.finditer(did_text):
+        # body runs to the first ';' outside any braces
+        depth, end = 0, len(did_text)
+        for p in _BODY_DELIM_RE.finditer(did_text, m.end()):
+            c = p.group()
+            if c == "{":
+                depth += 1
+            elif c == "}":
+                depth -= 1
+            elif depth == 0:
+                end = p.start()
+                break
+        defs.setdefault(m.group(1) or m.group(2), did_text[m.end():end])
+    return defs
+
+
+def _type_tokens(type_expr: str, defs: Dict[str, str]) -> set[str]:
+    """All identifiers reachable from a type expression, following aliases."""
+    tokens: set[str] = set()
+    pending = [type_expr]
+    while pending:
+        for tok in _IDENT_RE.findall(pending.pop()):
+            if tok in tokens:
+                continue
+            tokens.add(tok)
+            if tok in defs:
+                pending.append(defs[tok])
+    return tokens
+
+
+def _build_method_info(did_text: str) -> Dict[str, MethodInfo]:
+    """
+    Scan the (comment-stripped) .did once and index every method signature
+    by name, so per-call lookups don't have to search the text again.
+    """
+    defs = _type_definitions(did_text)
+    info: Dict[str, MethodInfo] = {}
+    for m in _METHOD_RE.finditer(did_text):
+        name = m.group("quoted") or m.group("name")
+        if name in info:
+            continue  # first declaration wins, same as the old per-call re.search
+        tokens = _type_tokens(m.group("ret"), defs)
+        info[name] = MethodInfo(
+            is_query=m.group("query") is not None,
+            has_records="record" in tokens,
+            has_variants="variant" in tokens,
+            # func/service references decode to principals as well
+            has_principal=not tokens.isdisjoint(("principal", "func", "service")),
+        )
+    return info
+
+
+@lru_cache(maxsize=8)
+def _parse_did(path: Path, mtime_ns: int) -> DidMetadata:
+    """Read and index a .did file. Cached per (path, mtime) for the whole process."""
+    source = path.read_bytes().decode("utf-8")
+    logger.info("Loaded Candid interface from %s (%d chars)", path, len(source))
+
+    text = strip_candid_comments(source)
+    hash_to_name = _build_field_hash_map(text)
+    candid_actor = _parse_candid_actor(source)
+    return DidMetadata(
+        source=source,
+        str_key_rename={f"_{h}": n for h, n in hash_to_name.items()},
+        method_info=_build_method_info(text),
+        candid_actor=candid_actor,
+    )
+
+
+def load_did_metadata(path: Path) -> DidMetadata:
+    """Parsed .did for `path`; re-parsed only when the file's mtime changes."""
+    return _parse_did(path, path.stat().st_mtime_ns)
+
+
+def preload_did() -> DidMetadata:
+    """Parse the .did every ICActor is built from, so the first actor doesn't pay for it."""
+    return load_did_metadata(_DID_PATH)
+
+
 class ICActor:
+    __slots__ = (
+        "agent",
+        "canister_id",
+        "_str_key_rename",
+        "_method_info",
+        "canister",
+        "_can_id",
+        "_methods",
+    )
+
     def __init__(self, agent: ICAgent, canister_id: str):
         self.agent = agent
         self.canister_id = canister_id
 
-        candid_interface = self._load_candid_interface()
-        if not candid_interface:
+        did = self._load_candid_interface()
+        if did is None or not did.source:
             raise RuntimeError("Could not load Candid interface from .did file")
 
-        self._candid_text = candid_interface
-        self._hash_to_name = self._build_field_hash_map(candid_interface)
+        # Shared, read-only across every actor built from the same .did
+        self._str_key_rename = did.str_key_rename
+        self._method_info = did.method_info
 
-        self.canister = Canister(
-            agent=agent.agent,
-            canister_id=canister_id,
-            candid=candid_interface,
+        self.canister = _bind_canister(agent.agent, canister_id, did.source, did.candid_actor)
+        self._can_id = (
+            getattr(self.canister, "canister_id", None) or getattr(self.canister, "_canister_id", None)
         )
+        if not self._can_id:
+            raise RuntimeError("Cannot find canister id on Canister instance")
+        self._methods: Optional[tuple[str, ...]] = None  # filled by get_methods()
 
-    # --------- hashing / DID map ---------
-
-    def _candid_hash(self, name: str) -> int:
-        """Candid field-id hash: foldl(h*223 + byte) mod 2^32."""
-        h = 0
-        for b in name.encode("utf-8"):
-            h = (h * 223 + b) & 0xFFFFFFFF
-        return h
+    # --------- DID loading ---------
 
-    def _load_candid_interface(self) -> str:
+    def _load_candid_interface(self) -> Optional[DidMetadata]:
         try:
-            did_file_path = os.path.join(
-                os.path.dirname(__file__), "..", "data", "canisters", "m_autonome_canister.did"
-            )
-            with open(did_file_path, "r") as f:
-                candid_text = f.read()
-            print(f"Loaded Candid interface from {did_file_path} ({len(candid_text)} chars)")
-            return candid_text
+            return load_did_metadata(_DID_PATH)
         except Exception as e:
-            print(f"Failed to load Candid interface: {e}")
-            return ""
-
-    def _build_field_hash_map(self, did_text: str) -> dict[int, str]:
-        """
-        Parse the .did and collect ALL record field names and variant labels.
-        Important: we do NOT filter out keywords like 'text'/'nat' if they appear
-        in *label positions*; Candid allows those as labels, and they hash on-wire.
-        """
-        src = strip_candid_comments(did_text)
-        names: set[str] = set()
-
-        # -------- 1) RECORD FIELDS: record { "field" : T; field : T; ... } --------
-        # Match a quoted or bare identifier immediately before a colon
-        for body in iter_balanced_blocks(src, "record"):
-            for m in re.finditer(r'(?:"([^"]+)"|([A-Za-z_][\w-]*))\s*:', body):
-                nm = m.group(1) or m.group(2)
-                if nm:
-                    names.add(nm)
-
-        # -------- 2) VARIANT LABELS: variant { A; "B"; C : T; "D" : T; ... } ------
-        for body in iter_balanced_blocks(src, "variant"):
-            # 2a) Typed arms: label before ':'
-            for m in re.finditer(r'(?:"([^"]+)"|([A-Za-z_][\w-]*))\s*:', body):
-                nm = m.group(1) or m.group(2)
-                if nm:
-                    names.add(nm)
-
-            # 2b) Unit arms: label at arm boundaries (start|{,|; then label then ,|;|})
-            # This avoids picking up type tokens because those follow a ':' rather than a boundary.
-            for m in re.finditer(
-                r'(?:(?<=^)|(?<=[{,;]))\s*(?:"([^"]+)"|([A-Za-z_][\w-]*))\s*(?=[,;}])',
-                body,
-            ):
-                nm = m.group(1) or m.group(2)
-                if nm:
-                    names.add(nm)
-
-        # Common tags that sometimes aren’t explicitly present (cheap safety net)
-        names.update({"ok", "err"})
-
-        # Build hash -> name map
-        mapping = {self._candid_hash(n): n for n in names}
-
-        # Helpful diagnostics (keep short)
-        print(f"Built hash->name map with {len(mapping)} entries; "
-            f"includes 'text'? {'yes' if self._candid_hash('text') in mapping else 'no'} "
-            f"(hash={self._candid_hash('text')})")
-
-        return mapping
+            logger.error("Failed to load Candid interface: %s", e)
+            return None
 
     # --------- tree normalization (dynamic) ---------
 
-    def _rehydrate_hashed_keys(self, obj: Any) -> Any:
-        """
-        Rename keys like '_3535639105' back to their Candid names using the map
-        we built from the .did, recursively.
-        """
-        if isinstance(obj, dict):
-            newd = {}
-            for k, v in obj.items():
-                newk = k
-                if isinstance(k, str) and k.startswith("_") and k[1:].isdigit():
-                    try:
-                        h = int(k[1:])
-                        mapped = self._hash_to_name.get(h)
-                        if mapped:
-                            newk = mapped
-                    except ValueError:
-                        pass
-                newd[newk] = self._rehydrate_hashed_keys(v)
-            return newd
-        if isinstance(obj, list):
-            return [self._rehydrate_hashed_keys(x) for x in obj]
-        return obj
-
-    def _unwrap_unit_variants_inplace(self, obj: Any) -> None:
+    def _normalize(self, obj: Any) -> Any:
         """
-        Convert objects like {'oneOnOne': None} into 'oneOnOne' (unit variants),
-        across the whole structure.
+        Rename hashed keys, collapse unit variants and stringify principals
+        in one pass (see normalize_candid_tree).
         """
-        if isinstance(obj, dict):
-            if len(obj) == 1:
-                (k, v), = obj.items()
-                if v is None:
-                    obj.clear()
-                    obj["__unit__"] = k  # temporary marker replaced in parent
-                    return
-            for key in list(obj.keys()):
-                val = obj[key]
-                self._unwrap_unit_variants_inplace(val)
-                if isinstance(val, dict) and "__unit__" in val and len(val) == 1:
-                    obj[key] = val["__unit__"]
-        elif isinstance(obj, list):
-            for i in range(len(obj)):
-                self._unwrap_unit_variants_inplace(obj[i])
-
-    def _convert_principals_inplace(self, obj: Any) -> Any:
-        """
-        Replace any ic.principal.Principal instances with their text form
-        (e.g., 'aaaaa-aa...') so the result is JSON-serializable.
-        """
-        if ICPrincipal is None:
-            return obj
-        if isinstance(obj, dict):
-            for k, v in list(obj.items()):
-                obj[k] = self._convert_principals_inplace(v)
-            return obj
-        if isinstance(obj, list):
-            for i, v in enumerate(obj):
-                obj[i] = self._convert_principals_inplace(v)
-            return obj
-        if isinstance(obj, ICPrincipal):
-            return obj.to_str() if hasattr(obj, "to_str") else str(obj)
-        return obj
+        return normalize_candid_tree(obj, self._str_key_rename, ICPrincipal)
 
     # --------- calling ---------
 
-    async def call_method(
-        self,
-        method_name: str,
-        args: Optional[List[Any]] = None,
-        *,
-        return_type: Optional[str] = None,
-        enable_fallback: bool = True,
-    ):
-        # try:
-        #     print(f"Calling canister method (wrapper): {method_name}")
-        #     method = getattr(self.canister, method_name)
-        #     result = method(*args) if args else method()
-
-        #     # dynamic cleanup on wrapper path
-        #     result = self._rehydrate_hashed_keys(result)
-        #     self._unwrap_unit_variants_inplace(result)
-        #     result = transform_login_result(result)      # subaccounts to HEX
-        #     result = self._convert_principals_inplace(result)  # principals to text
-        #     print("Wrapper result:", type(result))
-        #     return result
-
-        # except Exception as e:
-        #     msg = str(e)
-        #     print(f"Wrapper raised: {msg}")
-
-        #     if not enable_fallback or not any(s in msg for s in DECODE_ERRORS):
-        #         return {"status": "error", "message": msg}
-
-            try:
-                raw_or_tree = self._raw_call(method_name, args)
-
-                # A) If we got true Candid bytes -> decode using return type (auto or provided)
-                if isinstance(raw_or_tree, (bytes, bytearray)):
-                    rtype = return_type or self._extract_return_type(method_name)
-                    print(f"Return type: {rtype}")
-                    if rtype:
-                        decoded = decode(raw_or_tree, rtype)
-                    else:
-                        # last resort: try a permissive variant probe
-                        try:
-                            which = decode(raw_or_tree, "variant { err : reserved; ok : reserved }")
-                            decoded = which  # at least return which arm
-                        except Exception:
-                            return {"status": "raw-bytes", "bytes": raw_or_tree}
-
-                    decoded = self._rehydrate_hashed_keys(decoded)
-                    self._unwrap_unit_variants_inplace(decoded)
-                    decoded = transform_login_result(decoded)
-                    decoded = self._convert_principals_inplace(decoded)
-                    return decoded
-
-                # B) ic-py returned a Python structure (ids as keys) -> hydrate & normalize
-                print("Raw call returned a Python structure; rehydrating hashed field names...")
-                hydrated = self._rehydrate_hashed_keys(raw_or_tree)
-                self._unwrap_unit_variants_inplace(hydrated)
-                hydrated = transform_login_result(hydrated)
-                hydrated = self._convert_principals_inplace(hydrated)
-                return hydrated
-
-            except Exception as e2:
-                return {"status": "error", "message": f"fallback decode failed: {e2}"}
+    async def call_method(self, method_name: str, args: Optional[List[Any]] = None):
+        try:
+            # ic-py's query_raw/update_raw block (update_raw polls read_state
+            # until the call is certified); keep the event loop free meanwhile.
+            raw_tree = await asyncio.to_thread(self._raw_call, method_name, args)
+
+            # ic-py 1.0.1's query_raw/update_raw always decode the reply
+            # themselves (ids as keys) -> hydrate & normalize
+            return self._postprocess(method_name, raw_tree)
+
+        except Exception as e2:
+            return {"status": "error", "message": f"fallback decode failed: {e2}"}
+
+    def _postprocess(self, method_name: str, result: Any) -> Any:
+        """Normalize a decoded reply, skipping the passes its return type can't need."""
+        info = self._method_info.get(method_name)
+        if info is not None and not (info.has_records or info.has_variants or info.has_principal):
+            return result  # primitive reply: nothing to rename, collapse or convert
+        result = self._normalize(result)
+        if info is None or info.has_records:
+            # subaccounts live in records; _normalize already returned a fresh tree
+            result = transform_login_result(result, inplace=True)
+        return result
 
     def _is_query(self, method_name: str) -> bool:
-        mname = re.escape(method_name)
-        pattern = rf'(?:"{mname}"|\b{mname}\b)\s*:\s*\([^)]*\)\s*->\s*\([^)]*\)\s*query\b'
-        return re.search(pattern, self._candid_text, flags=re.IGNORECASE) is not None
+        info = self._method_info.get(method_name)
+        return info is not None and info.is_query
 
-    def _extract_return_type(self, method_name: str) -> Optional[str]:
+    def _raw_call(self, method_name: str, args: Optional[List[Any]]) -> Union[list, str]:
         """
-        Pull the declared return type for a method from the textual .did.
-        Returns the raw type expression inside the (...) after '->'.
+        Submit a raw call and return what ic-py decoded: the reply values
+        (list/dict with hashed keys), or a query's reject message.
         """
-        mname = re.escape(method_name)
-        pat = rf'(?:"{mname}"|\b{mname}\b)\s*:\s*\([^)]*\)\s*->\s*\(([^)]*)\)'
-        m = re.search(pat, self._candid_text, flags=re.IGNORECASE | re.S)
-        ret = m.group(1).strip() if m else None
-        if ret:
-            snippet = ret[:120]
-            print(f"extracted return type for {method_name}: {snippet}{'...' if len(ret) > 120 else ''}")
-        else:
-            print(f"could not extract return type for {method_name}")
-        return ret
-
-    def _raw_call(self, method_name: str, args: Optional[List[Any]]) -> Union[bytes, dict, list]:
-        """
-        Submit a raw call and return either:
-        - Candid reply bytes (preferred), or
-        - a Python structure already decoded by ic-py (list/dict with hashed keys).
-        """
-        print(f"Raw call: {method_name} with args: {args}")
+        logger.debug("Raw call: %s with args: %s", method_name, args)
 
         # >>> FIX: build a typed-params list for ic-py's encoder
         # register : (text, text, text, text) -> (...)
-        typed_params = [{'type': Types.Text, 'value': v} for v in (args or [])]
-        arg_blob = encode(typed_params)   # encode takes ONE argument (the typed list), not (values, types)
+        if args:
+            typed_params = [{'type': Types.Text, 'value': v} for v in args]
+            arg_blob = encode(typed_params)   # encode takes ONE argument (the typed list), not (values, types)
+        else:
+            arg_blob = _EMPTY_ARGS
 
         # tiny sanity check
-        try:
-            print(f"encoded args head={bytes(arg_blob)[:4]!r}")  # should be b'DIDL'
-        except Exception:
-            pass
-
-        can_id = getattr(self.canister, "canister_id", None) or getattr(self.canister, "_canister_id")
-        if not can_id:
-            raise RuntimeError("Cannot find canister id on Canister instance")
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("encoded args head=%r", bytes(arg_blob)[:4])  # should be b'DIDL'
 
         if self._is_query(method_name):
-            print("raw query_raw() fallback")
-            raw = self.agent.agent.query_raw(can_id, method_name, arg_blob)
+            logger.debug("raw query_raw() fallback")
+            raw = self.agent.agent.query_raw(self._can_id, method_name, arg_blob)
         else:
-            print("raw update_raw() fallback")
-            raw = self.agent.agent.update_raw(can_id, method_name, arg_blob)
-
-        if isinstance(raw, tuple) and isinstance(raw[0], (bytes, bytearray)):
-            return raw[0]
+            logger.debug("raw update_raw() fallback")
+            raw = self.agent.agent.update_raw(self._can_id, method_name, arg_blob)
         return raw
 
     # --- Introspection helper ---
 
     def get_methods(self):
-        return self._exposed_methods()
-
-    def _exposed_methods(self):
-        names = []
-        for name in dir(self.canister):
-            if name.startswith("_"):
-                continue
-            attr = getattr(self.canister, name)
-            if callable(attr):
-                names.append(name)
-        return sorted({n[:-6] if n.endswith("_async") else n for n in names})
+        # The canister's method set never changes, so scan dir() only once
+        if self._methods is None:
+            self._methods = self._exposed_methods()
+        return list(self._methods)
+
+    def _exposed_methods(self) -> tuple[str, ...]:
+        names = frozenset(
+            name[:-6] if name.endswith("_async") else name
+            for name in dir(self.canister)
+            if not name.startswith("_") and callable(getattr(self.canister, name))
+        )
+        return tuple(sorted(names))
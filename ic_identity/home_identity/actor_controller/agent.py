@@ -1,29 +1,87 @@
+import logging
+from threading import Lock
+
+import httpx
+
 # Import IC libraries - fail if not available
 from ic.client import Client
 from ic.agent import Agent
 from ic.identity import Identity
 
+logger = logging.getLogger(__name__)
+
+_CBOR_HEADERS = {'Content-Type': 'application/cbor'}
+
+
+class PooledClient(Client):
+    """
+    ic-py Client that sends through one keep-alive httpx.Client.
+
+    The stock Client posts with module-level httpx.post(), which opens (and
+    TLS-handshakes) a new connection for every query/update/read_state.
+    Only the blocking methods are overridden; they are the ones Agent uses.
+    """
+
+    def __init__(self, url: str = "https://ic0.app"):
+        super().__init__(url)
+        self._http = httpx.Client(limits=httpx.Limits(max_keepalive_connections=32))
+
+    def _post(self, canister_id, kind, data):
+        endpoint = self.url + '/api/v2/canister/' + canister_id + '/' + kind
+        return self._http.post(endpoint, content=data, headers=_CBOR_HEADERS)
+
+    def query(self, canister_id, data):
+        return self._post(canister_id, 'query', data).content
+
+    def call(self, canister_id, req_id, data):
+        self._post(canister_id, 'call', data)
+        return req_id
+
+    def read_state(self, canister_id, data):
+        return self._post(canister_id, 'read_state', data).content
+
+    def status(self):
+        return self._http.get(self.url + '/api/v2/status').content
+
+    def close(self):
+        self._http.close()
+
+
+# One client (and connection pool) per host, shared by every agent
+# regardless of identity.
+_CLIENTS = {}
+_CLIENTS_LOCK = Lock()
+
+
+def _client_for(host: str) -> PooledClient:
+    client = _CLIENTS.get(host)
+    if client is None:
+        with _CLIENTS_LOCK:
+            # Only build (and open) an httpx.Client if nobody else did meanwhile
+            client = _CLIENTS.get(host)
+            if client is None:
+                client = _CLIENTS[host] = PooledClient(url=host)
+    return client
+
 
 class ICAgent:
     """Real IC Agent for canister communication."""
-    
+
+    __slots__ = ("identity", "host", "fetch", "_invalidated", "_is_local", "client", "agent")
+
     def __init__(self, identity: Identity, host: str = None, fetch=None):
         self.identity = identity
         self.host = host
         self.fetch = fetch
         self._invalidated = False
-        self.client = Client(url=host)
+        # The host never changes for an agent; classify it once
+        self._is_local = bool(host) and ('localhost' in host or '127.0.0.1' in host)
+        self.client = _client_for(host)
         self.agent = Agent(identity, self.client)
-        print(f"IC agent created for {host}")
+        logger.info("IC agent created for %s", host)
     
     async def fetch_root_key(self):
         """Fetch root key for local development."""
-        if 'localhost' in self.host or '127.0.0.1' in self.host:
+        if self._is_local:
             await self.agent.fetch_root_key()
-            print(f"Fetched root key for local development")
-    
-    def replace_identity(self, new_identity):
-        """Replace the current identity."""
-        self.identity = new_identity
-        self.agent = Agent(new_identity, self.client)
-
+            logger.info("Fetched root key for local development")
@@ -1,13 +1,56 @@
+import gzip
 import logging
 from aiohttp import web
 
 from .controllers.canister_controller import CanisterController
 from .controllers.identity_controller import IdentityController
 from ..identity.identity_manager import IdentityManager
+from .responses import json_response
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# CORS headers that do not depend on the request
+_CORS_STATIC = {
+    'Vary': 'Origin',
+    'Access-Control-Allow-Methods': 'GET,POST,OPTIONS',
+    'Access-Control-Max-Age': '86400',
+}
+
+# Smaller bodies aren't worth the gzip header and CPU
+_GZIP_MIN_SIZE = 512
+
+
+def _accepts_gzip(accept_encoding: str) -> bool:
+    """
+    True if an Accept-Encoding header allows gzip: listed (or matched by "*")
+    with a q-value above 0. An explicit gzip entry wins over "*".
+    """
+    gzip_q = star_q = None
+    for item in accept_encoding.split(','):
+        coding, *params = item.split(';')
+        coding = coding.strip().lower()
+        if coding not in ('gzip', 'x-gzip', '*'):
+            continue
+        q = 1.0
+        for param in params:
+            name, _, value = param.partition('=')
+            if name.strip().lower() == 'q':
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        if coding == '*':
+            star_q = q
+        else:
+            gzip_q = q
+    if gzip_q is None:
+        gzip_q = star_q
+    return gzip_q is not None and gzip_q > 0
+
+# Health replies never change; serialize once (a Response itself can't be reused)
+_HEALTH_BODY = b'{"status": "up"}'
+
 class ApiServer:
     def __init__(self, host: str, port: int):
         self.host = host
@@ -19,7 +62,8 @@ class ApiServer:
 
     async def start(self):
         self._setup_web_routes()
-        runner = web.AppRunner(self.app)
+        # No per-request access log line; errors are still logged by _error_middleware
+        runner = web.AppRunner(self.app, access_log=None)
         await runner.setup()
         site = web.TCPSite(runner, self.host, self.port)
         await site.start()
@@ -37,6 +81,10 @@ class ApiServer:
         self.app.router.add_get('/api/v1/canisters/methods/{canister_name}', self.canister_controller.get_canister_methods)
         self.app.router.add_delete('/api/v1/canisters/delete/{canister_name}', self.canister_controller.delete_canister)
 
+        # aiohttp runs the first middleware outermost: gzip sees the final
+        # body and headers, and CORS wraps the error handler so 500
+        # responses still carry the CORS headers.
+        self.app.middlewares.append(self._gzip_middleware)
         self.app.middlewares.append(self.cors_middleware)
         self.app.middlewares.append(self._error_middleware)
 
@@ -47,32 +95,51 @@ class ApiServer:
         try:
             return await handler(request)
         except Exception as e:
-            logger.error(f"Request error: {e}")
-            return web.json_response(
+            logger.error("Request error: %s", e)
+            return json_response(
                 {"error": str(e), "status": "error"}, 
                 status=500
             )
 
+    @web.middleware
+    async def _gzip_middleware(self, request, handler):
+        """gzip (level 1) larger bodies for clients that accept it."""
+        resp = await handler(request)
+        body = getattr(resp, 'body', None)
+        if (
+            isinstance(body, bytes)
+            and len(body) > _GZIP_MIN_SIZE
+            and 'Content-Encoding' not in resp.headers
+            and _accepts_gzip(request.headers.get('Accept-Encoding', ''))
+        ):
+            resp.body = gzip.compress(body, compresslevel=1)
+            resp.headers['Content-Encoding'] = 'gzip'
+            vary = resp.headers.get('Vary')
+            resp.headers['Vary'] = f'{vary}, Accept-Encoding' if vary else 'Accept-Encoding'
+        return resp
+
     @web.middleware
     async def cors_middleware(self,request, handler):
-        # Handle preflight quickly
+        origin = request.headers.get('Origin', '*')  # or '*' if you prefer
+        # Handle preflight quickly, without touching the route handler
         if request.method == 'OPTIONS':
-            resp = web.Response(status=204)
-        else:
-            resp = await handler(request)
-
-        origin = request.headers.get('Origin', '*')
-        req_hdrs = request.headers.get('Access-Control-Request-Headers', '*')
+            req_hdrs = request.headers.get('Access-Control-Request-Headers', '*')
+            return web.Response(status=204, headers={
+                **_CORS_STATIC,
+                'Access-Control-Allow-Origin': origin,
+                'Access-Control-Allow-Headers': req_hdrs,
+            })
 
-        resp.headers['Access-Control-Allow-Origin'] = origin  # or '*' if you prefer
-        resp.headers['Vary'] = 'Origin'
-        resp.headers['Access-Control-Allow-Methods'] = 'GET,POST,OPTIONS'
-        resp.headers['Access-Control-Allow-Headers'] = req_hdrs
-        resp.headers['Access-Control-Max-Age'] = '86400'
+        resp = await handler(request)
+        resp.headers.update(_CORS_STATIC)
+        resp.headers['Access-Control-Allow-Origin'] = origin
+        resp.headers['Access-Control-Allow-Headers'] = request.headers.get(
+            'Access-Control-Request-Headers', '*'
+        )
         return resp
 
     def _health_response(self, request: web.Request):
-        return web.json_response({'status': 'up'}, status=200)
+        return web.Response(body=_HEALTH_BODY, status=200, content_type='application/json')
         
 
     async def stop(self):
@@ -1,7 +1,13 @@
+import asyncio
+import logging
+
 from aiohttp import web
 from typing import Dict, Any
 
 from ...identity.identity_manager import IdentityManager
+from ..responses import json_response
+
+logger = logging.getLogger(__name__)
 
 class CanisterController:
     def __init__(self, identity_manager: IdentityManager):
@@ -11,12 +17,12 @@ class CanisterController:
         """Get all canisters."""
         try:
             canisters = self.identity_manager.list_canisters()
-            return web.json_response({
+            return json_response({
                 'status': 'success',
                 'canisters': canisters
             })
         except Exception as e:
-            return web.json_response({
+            return json_response({
                 'status': 'error',
                 'message': str(e)
             }, status=500)
@@ -26,12 +32,12 @@ class CanisterController:
         try:
             canister_name = request.match_info['canister_name']
             canister_info = self.identity_manager.get_canister_info(canister_name)
-            return web.json_response({
+            return json_response({
                 'status': 'success',
                 'canister': canister_info
             })
         except Exception as e:
-            return web.json_response({
+            return json_response({
                 'status': 'error',
                 'message': str(e)
             }, status=500)
@@ -43,18 +49,19 @@ class CanisterController:
             canister_id = data.get('canister_id')
             canister_name = data.get('canister_name')
             if not canister_id:
-                return web.json_response({
+                return json_response({
                     'status': 'error',
                     'message': 'canister_id is required'
                 }, status=400)
             
-            result = self.identity_manager.add_canister(canister_id, canister_name)
-            return web.json_response({
+            # Parses the .did on first use and writes the registry; keep both off the event loop
+            result = await asyncio.to_thread(self.identity_manager.add_canister, canister_id, canister_name)
+            return json_response({
                 'status': 'success',
                 'result': result
             }, status=201)
         except Exception as e:
-            return web.json_response({
+            return json_response({
                 'status': 'error',
                 'message': str(e)
             }, status=500) 
@@ -66,15 +73,15 @@ class CanisterController:
             canister_name = data.get('canister_name')
             method_name = data.get('method_name')
             args = data.get('args')
-            print(f"Calling canister {canister_name} method {method_name} with args {args}")
+            logger.debug("Calling canister %s method %s with args %s", canister_name, method_name, args)
         except Exception as e:
-            return web.json_response({
+            return json_response({
                 'status': 'error',
                 'message': str(e)
             }, status=500)
         
         result = await self.identity_manager.call_canister_method(canister_name, method_name, args)
-        return web.json_response({
+        return json_response({
             'status': 'success',
             'result': result
         }, status=200)
@@ -83,12 +90,12 @@ class CanisterController:
         """Delete a canister."""
         try:
             canister_name = request.match_info['canister_name']
-            self.identity_manager.delete_canister(canister_name)
-            return web.json_response({
+            await asyncio.to_thread(self.identity_manager.delete_canister, canister_name)
+            return json_response({
                 'status': 'success'
             }, status=200)
         except Exception as e:
-            return web.json_response({
+            return json_response({
                 'status': 'error',
                 'message': str(e)
             }, status=500)
@@ -97,13 +104,13 @@ class CanisterController:
         """Get the methods of a canister."""
         try:
             canister_name = request.match_info['canister_name']
-            methods = self.identity_manager.get_canister_methods(canister_name)
-            return web.json_response({
+            methods = await asyncio.to_thread(self.identity_manager.get_canister_methods, canister_name)
+            return json_response({
                 'status': 'success',
                 'methods': methods
             }, status=200)
         except Exception as e:
-            return web.json_response({
+            return json_response({
                 'status': 'error',
                 'message': str(e)
             }, status=500)
@@ -1,6 +1,9 @@
+import asyncio
+
 from aiohttp import web
 from typing import Dict, Any
 from ...identity.identity_manager import IdentityManager
+from ..responses import json_response
 
 class IdentityController:
     def __init__(self, identity_manager: IdentityManager):
@@ -10,7 +13,7 @@ class IdentityController:
         """Get current identity."""
         try:
             identity = self.identity_manager.identity
-            return web.json_response({
+            return json_response({
                 'status': 'success',
                 'identity': {
                     'principal': identity.principal,
@@ -18,7 +21,7 @@ class IdentityController:
                 }
             })
         except Exception as e:
-            return web.json_response({
+            return json_response({
                 'status': 'error',
                 'message': str(e)
             }, status=500)
@@ -26,8 +29,9 @@ class IdentityController:
     async def regenerate_identity(self, request: web.Request) -> web.Response:
         """Regenerate identity."""
         try:
-            new_identity = self.identity_manager.regenerate_identity()
-            return web.json_response({
+            # Key derivation (PBKDF2) and the file writes block; run them in a thread
+            new_identity = await asyncio.to_thread(self.identity_manager.regenerate_identity)
+            return json_response({
                 'status': 'success',
                 'identity': {
                     'principal': new_identity.principal,
@@ -35,7 +39,7 @@ class IdentityController:
                 }
             })
         except Exception as e:
-            return web.json_response({
+            return json_response({
                 'status': 'error',
                 'message': str(e)
             }, status=500)
@@ -0,0 +1,20 @@
+from typing import Any
+
+from aiohttp import web
+
+try:
+    import orjson
+except ImportError:
+    orjson = None  # fall back to aiohttp's stdlib-json response
+
+
+def json_response(data: Any, *, status: int = 200) -> web.Response:
+    """web.json_response, serialized with orjson when it is available."""
+    if orjson is not None:
+        try:
+            body = orjson.dumps(data, option=orjson.OPT_NON_STR_KEYS)
+        except TypeError:
+            pass  # e.g. Candid nats beyond 64 bits; the stdlib encoder copes
+        else:
+            return web.Response(body=body, status=status, content_type="application/json")
+    return web.json_response(data, status=status)
@@ -3,11 +3,12 @@
 from .ic_private_key import ICPrivateKey
 from .mnemonic import MnemonicManager
 from .ic_identity import ICIdentity
-from .identity_manager import IdentityManager
+from .identity_manager import IdentityManager, StalePreconditionError
 
 __all__ = [
     "ICPrivateKey",
     "MnemonicManager",
     "ICIdentity",
     "IdentityManager",
+    "StalePreconditionError",
 ]
\ No newline at end of file
@@ -1,10 +1,15 @@
+from ic.principal import Principal
+
+_ANONYMOUS_PRINCIPAL_ID = "2vxsx-fae"  # Standard anonymous principal
+_ANONYMOUS_PRINCIPAL = Principal.from_str(_ANONYMOUS_PRINCIPAL_ID)
+
+
 class AnonymousIdentity:
     """Anonymous identity for IC interactions."""
-    
+
     def __init__(self):
-        self.principal_id = "2vxsx-fae"  # Standard anonymous principal
-    
+        self.principal_id = _ANONYMOUS_PRINCIPAL_ID
+
     def get_principal(self):
         """Get the anonymous principal."""
-        from ..identity.ic_identity import Principal
-        return Principal(self.principal_id)
+        return _ANONYMOUS_PRINCIPAL
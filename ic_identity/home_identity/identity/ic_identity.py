@@ -8,11 +8,12 @@ class ICIdentity:
         self._private_key = private_key
         self._identity = ICPyIdentity(private_key.hex())
         self._principal = Principal.self_authenticating(self._identity.der_pubkey)
+        self._principal_text = self._principal.to_str()  # base32 + CRC32, compute once
     
     @property
     def principal(self):
         """Get the principal ID."""
-        return self._principal.to_str()
+        return self._principal_text
     
     @property
     def public_key(self):
@@ -28,8 +29,3 @@ class ICIdentity:
     def identity(self):
         """Get the identity."""
         return self._identity
-
-    def regenerate_identity(self, private_key: bytes):
-        """Regenerate the identity."""
-        self._private_key = private_key
-        self._identity = ICPyIdentity(private_key)
\ No newline at end of file
@@ -1,10 +1,19 @@
+import asyncio
+import hashlib
 import json
 import logging
 import os
+import re
+import tempfile
 from datetime import datetime
 from pathlib import Path
 from threading import RLock
-from typing import Any, Dict, Optional
+from typing import Any, Dict, Iterable, Optional, Tuple
+
+try:
+    import orjson
+except ImportError:
+    orjson = None  # stdlib json below
 
 from ..actor_controller.actor import ICActor
 from ..actor_controller.agent import ICAgent
@@ -13,12 +22,75 @@ from .ic_private_key import ICPrivateKey
 
 logger = logging.getLogger(__name__)
 
+# Fold journal.jsonl back into canisters.json once it holds this many entries
+_JOURNAL_COMPACT_LINES = 256
+
+# Textual principal: base32 (a-z2-7) in dash-separated groups of 5; at most
+# 29 bytes encoded, i.e. 63 chars. Catches garbage before an actor is built.
+_CANISTER_ID_RE = re.compile(r"(?:[a-z2-7]{5}-)*[a-z2-7]{1,5}")
+_CANISTER_ID_MAX_LEN = 63
+
+
+class StalePreconditionError(RuntimeError):
+    """canisters.json changed on disk since this manager last read or wrote it."""
+
+
+def _is_canister_id(value: Any) -> bool:
+    return (
+        isinstance(value, str)
+        and len(value) <= _CANISTER_ID_MAX_LEN
+        and _CANISTER_ID_RE.fullmatch(value) is not None
+    )
+
+
+# ---------- serialization ----------
+def _dumps(payload: Dict[str, Any]) -> bytes:
+    """Serialize the registry payload as compact JSON (only this module reads it)."""
+    if orjson is not None:
+        return orjson.dumps(payload)
+    return json.dumps(payload, separators=(",", ":")).encode("utf-8")
+
+
+def _dumps_line(entry: Dict[str, Any]) -> bytes:
+    """One compact JSON line for the journal."""
+    return _dumps(entry) + b"\n"
+
+
+def _loads(data: bytes) -> Any:
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+# ---------- file I/O ----------
+def _file_sha256(path: Path) -> Optional[bytes]:
+    try:
+        with open(path, "rb") as f:
+            return hashlib.sha256(f.read()).digest()
+    except FileNotFoundError:
+        return None
+
+
+def _write_all(fd: int, data: bytes) -> None:
+    view = memoryview(data)
+    while view:
+        view = view[os.write(fd, view):]
+
+
+def _fsync_dir(path: Path) -> None:
+    dir_fd = os.open(path, os.O_RDONLY)
+    try:
+        os.fsync(dir_fd)
+    finally:
+        os.close(dir_fd)
+
 
 class IdentityManager:
     """
     Manages the current IC identity, a registry of canisters (name -> id),
     and ICActor instances (keyed by canister_id).
-    Persists the registry to DATA_DIR/canisters/canisters.json.
+    Persists the registry to DATA_DIR/canisters/canisters.json (snapshot)
+    plus journal.jsonl next to it (one line per add/delete since the snapshot).
     """
 
     def __init__(self, *, host: str = "https://icp-api.io"):
@@ -27,6 +99,10 @@ class IdentityManager:
         # Identity (private key handling stays in your ICPrivateKey/ICIdentity classes)
         self._private_key = ICPrivateKey()
         self._identity = ICIdentity(self._private_key.private_key)
+        # ic-py identity behind ICIdentity; only changes in regenerate_identity
+        self._inner_identity = self._identity.identity
+        # One agent for every actor; it only depends on identity and host
+        self._agent = ICAgent(self._inner_identity, self._host)
 
         # Runtime registries
         self._actors: Dict[str, ICActor] = {}    # canister_id -> ICActor
@@ -41,10 +117,22 @@ class IdentityManager:
         self._canisters_dir = self._data_dir / "canisters"
         self._canisters_dir.mkdir(parents=True, exist_ok=True)
         self._canisters_file = self._canisters_dir / "canisters.json"
+        self._journal_file = self._canisters_dir / "journal.jsonl"
 
-        # Concurrency guard
+        # Concurrency guard: reads go straight to the dicts (single get/set
+        # operations are atomic in CPython); every change is written to disk
+        # and then applied under _lock, so memory never runs ahead of the files.
+        # Actors are built under _lock too, so one built from an agent that
+        # regenerate_identity has since replaced is never published.
         self._lock = RLock()
 
+        # SHA-256 of canisters.json as last read/written by us (None: no file)
+        self._last_sha256: Optional[bytes] = None
+
+        # Journal state: last sequence number used and lines on disk
+        self._seq = 0
+        self._journal_lines = 0
+
         self._load_canisters()
 
     @property
@@ -54,118 +142,285 @@ class IdentityManager:
     # ---------- persistence ----------
     def _load_canisters(self) -> None:
         """Load canisters from persistent storage on startup."""
-        if not self._canisters_file.exists():
+        self._load_snapshot()
+        self._replay_journal()
+        logger.info("Loaded %d canister(s).", len(self._canisters))
+
+    def _load_snapshot(self) -> None:
+        try:
+            with open(self._canisters_file, "rb") as f:
+                raw = f.read()
+        except FileNotFoundError:
             logger.debug("No canisters file at %s", self._canisters_file)
             return
+        except Exception as e:
+            logger.error("Failed to load canisters: %s", e)
+            return
 
         try:
-            with open(self._canisters_file, "r", encoding="utf-8") as f:
-                data = json.load(f)
+            self._last_sha256 = hashlib.sha256(raw).digest()
+            data = _loads(raw)
 
             can_map = data.get("canisters", {})
             if not isinstance(can_map, dict):
                 logger.warning("Invalid canisters.json format; ignoring.")
                 return
 
-            bad_names = []
-            for name, canister_id in can_map.items():
-                try:
-                    agent = ICAgent(self._identity.identity, self._host)
-                    actor = ICActor(agent, canister_id)
-                    self._actors[canister_id] = actor
-                except Exception as e:
-                    bad_names.append(name)
-                    logger.warning("Failed to recreate actor for %s (%s): %s", name, canister_id, e)
-
-            with self._lock:
-                self._canisters = {n: c for n, c in can_map.items() if n not in bad_names}
-
+            # Actors are built on first use (get_canister_actor), so an id
+            # that no longer works only fails the calls made against it.
+            self._canisters = {n: c for n, c in can_map.items() if _is_canister_id(c)}
+            bad_names = can_map.keys() - self._canisters.keys()
             if bad_names:
-                logger.info("Dropping invalid entries: %s", ", ".join(bad_names))
-                self._save_canisters()
-
-            logger.info("Loaded %d canister(s).", len(self._canisters))
+                logger.info("Dropping invalid entries: %s", ", ".join(sorted(bad_names)))
+            self._seq = int(data.get("seq", 0))
 
         except Exception as e:
             logger.error("Failed to load canisters: %s", e)
 
-    def _save_canisters(self) -> None:
-        """Save canisters to persistent storage with an atomic replace."""
+    def _replay_journal(self) -> None:
+        """Apply journal entries newer than the snapshot."""
         try:
-            payload = {
-                "canisters": self._canisters,
-                "last_updated": datetime.now().isoformat(),
-                "version": "1.0",
-            }
-
-            # Create a temp file in the same directory, then atomically replace
-            tmp_path = self._canisters_file.with_name(self._canisters_file.name + ".tmp")
-            with open(tmp_path, "w", encoding="utf-8") as f:
-                json.dump(payload, f, indent=2)
-
-            tmp_path.replace(self._canisters_file)
-            logger.debug("Saved %d canister(s) to %s", len(self._canisters), self._canisters_file)
+            with open(self._journal_file, "rb") as f:
+                lines = f.readlines()
+        except FileNotFoundError:
+            return
+        except Exception as e:
+            logger.error("Failed to read canister journal: %s", e)
+            return
 
+        for line in lines:
+            try:
+                entry = _loads(line)
+                seq, name = entry["seq"], entry["name"]
+            except Exception:
+                logger.warning("Skipping unreadable journal entry in %s", self._journal_file)
+                continue  # e.g. a line torn by a crash mid-append
+            if seq <= self._seq:
+                continue  # already in the snapshot
+            if entry.get("op") == "add":
+                if _is_canister_id(entry.get("id")):
+                    self._canisters[name] = entry["id"]
+            else:
+                self._canisters.pop(name, None)
+            self._seq = seq
+        self._journal_lines = len(lines)
+
+    def _journal(self, changes: Dict[str, Optional[str]]) -> None:
+        """
+        Append ``changes`` (name -> canister_id, or None for a delete) to the
+        journal before they are applied; call with _lock held. If this raises,
+        nothing was recorded and the caller must leave the registry as it is.
+        """
+        self._check_precondition()
+        seq = self._seq
+        ts = datetime.now().isoformat()
+        lines = []
+        for name, canister_id in changes.items():
+            seq += 1
+            entry = {"seq": seq, "name": name, "ts": ts}
+            if canister_id is None:
+                entry["op"] = "delete"
+            else:
+                entry["op"] = "add"
+                entry["id"] = canister_id
+            lines.append(_dumps_line(entry))
+        self._append_journal(lines)
+        self._seq = seq
+
+    def _compact(self) -> None:
+        """Fold a long journal into canisters.json; call with _lock held."""
+        if self._journal_lines < _JOURNAL_COMPACT_LINES:
+            return
+        try:
+            self._write_snapshot(self._canisters)
         except Exception as e:
-            logger.error("Failed to save canisters: %s", e)
+            # The journal still holds every change; compaction is retried next time
+            logger.error("Failed to compact canister journal: %s", e)
+
+    def _check_precondition(self) -> None:
+        """
+        Make sure canisters.json is still the file we last read or wrote. If
+        another writer replaced it, adopt that file and raise, so the journal
+        never extends a snapshot it wasn't written against.
+        """
+        if _file_sha256(self._canisters_file) == self._last_sha256:
+            return
+        self._rebase()
+        raise StalePreconditionError(
+            f"{self._canisters_file} was modified by another writer; "
+            "reloaded it, retry the change"
+        )
+
+    def _rebase(self) -> None:
+        """Reload the registry from canisters.json; call with _lock held."""
+        seq = self._seq
+        self._canisters.clear()
+        self._last_sha256 = None
+        self._load_snapshot()
+        # Keep numbering past anything we already used, so our next
+        # entries replay on top of the adopted snapshot
+        self._seq = max(self._seq, seq)
+        live = set(self._canisters.values())
+        for canister_id in [c for c in self._actors if c not in live]:
+            self._actors.pop(canister_id, None)
+        # The journal was relative to our last snapshot, not the adopted one
+        try:
+            os.truncate(self._journal_file, 0)
+        except FileNotFoundError:
+            pass
+        self._journal_lines = 0
+        logger.warning("Reloaded %d canister(s) from %s", len(self._canisters), self._canisters_file)
+
+    def _write_snapshot(self, canisters: Dict[str, str]) -> None:
+        """Replace canisters.json with ``canisters`` and empty the journal; call with _lock held."""
+        self._check_precondition()
+        self._write_canisters({
+            "canisters": dict(canisters),
+            "last_updated": datetime.now().isoformat(),
+            "version": "1.0",
+            "seq": self._seq,
+        })
+
+    def _append_journal(self, lines: list[bytes]) -> None:
+        """Append entries with one write + fsync."""
+        fd = os.open(self._journal_file, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o600)
+        try:
+            end = os.lseek(fd, 0, os.SEEK_END)
+            try:
+                _write_all(fd, b"".join(lines))
+                os.fsync(fd)
+            except BaseException:
+                # Don't leave a torn line for the next append to run into
+                os.ftruncate(fd, end)
+                raise
+        finally:
+            os.close(fd)
+        if not self._journal_lines:
+            _fsync_dir(self._canisters_dir)  # file may have just been created
+        self._journal_lines += len(lines)
+
+    def _write_canisters(self, payload: Dict[str, Any]) -> None:
+        """Atomically replace canisters.json with ``payload`` (after _check_precondition)."""
+        # Create a uniquely named (0600) temp file in the same directory, then
+        # atomically replace; only a file created here is ever removed
+        encoded = _dumps(payload)
+        fd, tmp_path = tempfile.mkstemp(
+            prefix=self._canisters_file.name + ".", suffix=".tmp", dir=self._canisters_dir
+        )
+        try:
+            try:
+                # Unbuffered: one write() for a payload this small, no io wrappers
+                _write_all(fd, encoded)
+                os.fsync(fd)
+            finally:
+                os.close(fd)
+            os.replace(tmp_path, self._canisters_file)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+        self._last_sha256 = hashlib.sha256(encoded).digest()
+
+        # Persist the rename itself
+        _fsync_dir(self._canisters_dir)
+
+        # Everything journaled is in the snapshot now (and entries up to
+        # "seq" are skipped on replay if we crash before truncating)
+        try:
+            os.truncate(self._journal_file, 0)
+        except FileNotFoundError:
+            pass
+        self._journal_lines = 0
+        logger.debug("Saved %d canister(s) to %s", len(payload["canisters"]), self._canisters_file)
 
     # ---------- registry ops ----------
-    def add_canister(self, canister_id: str, canister_name: Optional[str] = None) -> bool:
-        """Register a canister and prepare its ICActor."""
+    def _registry_name(self, canister_id: str, canister_name: Optional[str]) -> str:
         if not canister_id:
             raise ValueError("canister_id is required")
+        if not _is_canister_id(canister_id):
+            raise ValueError(f"Invalid canister_id: {canister_id}")
+        return (canister_name or canister_id).strip()
 
-        name = (canister_name or canister_id).strip()
-
-        agent = ICAgent(self._identity.identity, self._host)
-        actor = ICActor(agent, canister_id)
+    def add_canister(self, canister_id: str, canister_name: Optional[str] = None) -> bool:
+        """Register a canister and prepare its ICActor."""
+        name = self._registry_name(canister_id, canister_name)
 
         with self._lock:
+            actor = self._actors.get(canister_id) or ICActor(self._agent, canister_id)
+            self._journal({name: canister_id})
             self._canisters[name] = canister_id
             self._actors[canister_id] = actor
-            self._save_canisters()
+            self._compact()
 
         logger.info("Registered canister %s -> %s", name, canister_id)
         return True
 
+    def add_canisters(self, items: Iterable[Tuple[str, Optional[str]]]) -> int:
+        """
+        Register several ``(canister_id, canister_name)`` pairs with a single
+        journal write. Either all of them are registered or, on error, none.
+        """
+        changes: Dict[str, Optional[str]] = {}
+        count = 0
+        for canister_id, canister_name in items:
+            changes[self._registry_name(canister_id, canister_name)] = canister_id
+            count += 1
+
+        with self._lock:
+            actors = {c: self._actors.get(c) or ICActor(self._agent, c) for c in set(changes.values())}
+            self._journal(changes)
+            self._canisters.update(changes)
+            self._actors.update(actors)
+            self._compact()
+
+        logger.info("Registered %d canister(s)", count)
+        return count
+
     def delete_canister(self, canister_name: str) -> bool:
         """Remove a canister from the registry and drop its actor."""
         if not canister_name:
             raise ValueError("canister_name is required")
 
         with self._lock:
-            if canister_name not in self._canisters:
+            canister_id = self._canisters.get(canister_name)
+            if canister_id is None:
                 raise ValueError(f"Canister {canister_name} not found")
 
-            canister_id = self._canisters.pop(canister_name)
+            self._journal({canister_name: None})
+            del self._canisters[canister_name]
 
             # Drop actor if no other name references the same id
             if canister_id not in self._canisters.values():
                 self._actors.pop(canister_id, None)
-
-            self._save_canisters()
+            self._compact()
 
         logger.info("Deleted canister %s", canister_name)
         return True
 
     async def call_canister_method(self, canister_name: str, method_name: str, args: Optional[list] = None) -> Any:
         """Call a canister method via its actor. Returns the decoded result."""
-        if canister_name not in self._canisters:
-            raise ValueError(f"Canister {canister_name} not found")
-
-        canister_id = self._canisters[canister_name]
-        actor = self._actors.get(canister_id)
+        actor = self._actors.get(self.get_canister_id(canister_name))
         if actor is None:
-            agent = ICAgent(self._identity.identity, self._host)
-            actor = ICActor(agent, canister_id)
-            self._actors[canister_id] = actor
-
+            # Building one waits for _lock; keep that off the event loop
+            actor = await asyncio.to_thread(self.get_canister_actor, canister_name)
         return await actor.call_method(method_name, args or [])
 
+    async def call_canister_methods(
+        self, calls: Iterable[Tuple[str, str, Optional[list]]]
+    ) -> list[Any]:
+        """
+        Run several ``(canister_name, method_name, args)`` calls concurrently.
+        Results come back in order; a failed call yields its exception instead.
+        """
+        return await asyncio.gather(
+            *(self.call_canister_method(name, method, args) for name, method, args in calls),
+            return_exceptions=True,
+        )
+
     def get_canister_id(self, canister_name: str) -> str:
-        if canister_name not in self._canisters:
+        canister_id = self._canisters.get(canister_name)
+        if canister_id is None:
             raise ValueError(f"Canister {canister_name} not found")
-        return self._canisters[canister_name]
+        return canister_id
 
     def get_canister_info(self, canister_name: str) -> Dict[str, str]:
         return {"name": canister_name, "id": self.get_canister_id(canister_name)}
@@ -174,12 +429,16 @@ class IdentityManager:
         return list(self._canisters.keys())
 
     def get_canister_actor(self, canister_name: str) -> ICActor:
-        canister_id = self.get_canister_id(canister_name)
-        actor = self._actors.get(canister_id)
+        """Return the canister's actor, building it at most once."""
+        actor = self._actors.get(self.get_canister_id(canister_name))
         if actor is None:
-            agent = ICAgent(self._identity.identity, self._host)
-            actor = ICActor(agent, canister_id)
-            self._actors[canister_id] = actor
+            with self._lock:
+                # Look again: another caller may have built it, or
+                # regenerate_identity cleared the registry, while we waited
+                canister_id = self.get_canister_id(canister_name)
+                actor = self._actors.get(canister_id)
+                if actor is None:
+                    actor = self._actors[canister_id] = ICActor(self._agent, canister_id)
         return actor
 
     def get_canister_methods(self, canister_name: str) -> list[str]:
@@ -188,13 +447,16 @@ class IdentityManager:
     # ---------- identity rotation ----------
     def regenerate_identity(self) -> ICIdentity:
         """Replace the current identity and clear registry/actors."""
-        self._private_key = ICPrivateKey(regenerate=True)
-        self._identity = ICIdentity(self._private_key.private_key)
-
         with self._lock:
+            # Clear the registry on disk first: if that fails, nothing has changed
+            self._write_snapshot({})
             self._actors.clear()
             self._canisters.clear()
-            self._save_canisters()
+
+            self._private_key = ICPrivateKey(regenerate=True)
+            self._identity = ICIdentity(self._private_key.private_key)
+            self._inner_identity = self._identity.identity
+            self._agent = ICAgent(self._inner_identity, self._host)
 
         logger.info("Identity regenerated; registry cleared.")
         return self._identity
@@ -1,8 +1,14 @@
+import logging
 import os
 from pathlib import Path
 from typing import Optional
 from mnemonic import Mnemonic
 
+# Loading the wordlist reads and parses a 2048-line file; do it once
+_MNEMO = Mnemonic("english")
+
+logger = logging.getLogger(__name__)
+
 class MnemonicManager:
 
     DEFAULT_MNEMONIC_PATH = os.path.join(os.path.dirname(__file__), "..", "data", "identity", "ic-identity.mne")
@@ -14,7 +20,7 @@ class MnemonicManager:
         if not self._mnemonic or regenerate:
             self._mnemonic = self._generate_mnemonic()
             self._write_mnemonic(self._mnemonic)
-        self._seed = self._generate_seed()
+        self._seed: Optional[bytes] = None  # PBKDF2 (2048 rounds) runs on first access
 
     @property
     def mnemonic(self) -> str:
@@ -24,19 +30,21 @@ class MnemonicManager:
     @property
     def seed(self) -> bytes:
         """Get the seed."""
+        if self._seed is None:
+            self._seed = self._generate_seed()
         return self._seed
 
     def _generate_mnemonic(self) -> str:
         """Generate a new BIP39 mnemonic phrase."""
-        mnemo = Mnemonic("english")
+        mnemo = _MNEMO
         mnemonic_phrase = mnemo.generate(strength=128)  # 12 words
-        if not mnemo.check(mnemonic_phrase):
-            raise ValueError("Invalid mnemonic phrase")
+        # generate() appends a valid checksum by construction; only re-verify in debug runs
+        assert mnemo.check(mnemonic_phrase), "Invalid mnemonic phrase"
         return mnemonic_phrase  # 12 words
     
     def _generate_seed(self) -> bytes:
         """Generate a new BIP39 seed."""
-        mnemo = Mnemonic("english")
+        mnemo = _MNEMO
         seed = mnemo.to_seed(self._mnemonic)
         return seed
 
@@ -48,26 +56,18 @@ class MnemonicManager:
             Mnemonic string if file exists and is readable, None otherwise.
         """
         try:
-            mnemonic_file = Path(self._mnemonic_path)
-            if mnemonic_file.exists():
-                with open(mnemonic_file, 'r', encoding='utf-8') as f:
-                    content = f.read().strip()
-                    
-                    # Skip empty files or files with only comments
-                    if not content or content.startswith('#'):
-                        return None
-                    
-                    # Filter out comment lines and get the first valid line
-                    lines = content.split('\n')
-                    for line in lines:
-                        line = line.strip()
-                        if line and not line.startswith('#'):
-                            return line
-                    
-                    return None
+            # A few dozen bytes: one read, no text-mode wrapper
+            content = Path(self._mnemonic_path).read_bytes().decode('utf-8')
+            # First non-empty, non-comment line
+            for line in content.splitlines():
+                line = line.strip()
+                if line and not line.startswith('#'):
+                    return line
+            return None
+        except FileNotFoundError:
             return None
         except Exception as error:
-            print(f"Identity: Error reading mnemonic: {error}")
+            logger.error("Identity: Error reading mnemonic: %s", error)
             return None
         
     def _write_mnemonic(self, mnemonic: Optional[str] = None) -> bool:
@@ -88,11 +88,17 @@ class MnemonicManager:
             mnemonic_file = Path(self._mnemonic_path)
             mnemonic_file.parent.mkdir(parents=True, exist_ok=True)
             
-            # Write mnemonic to file
-            with open(mnemonic_file, 'w', encoding='utf-8') as f:
-                f.write(mnemonic)
+            # Write mnemonic to file (owner-only when created) and make it durable
+            data = memoryview(mnemonic.encode('utf-8'))
+            fd = os.open(mnemonic_file, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+            try:
+                while data:
+                    data = data[os.write(fd, data):]
+                os.fsync(fd)
+            finally:
+                os.close(fd)
             return True
         except Exception as error:
-            print(f"Identity: Error writing mnemonic: {error}")
+            logger.error("Identity: Error writing mnemonic: %s", error)
             return False
 
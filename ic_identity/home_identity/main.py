@@ -1,11 +1,25 @@
 import asyncio
+import gc
 import logging
 import signal
+from .actor_controller.actor import preload_did
 from .api.api import ApiServer
 
+try:
+    import uvloop  # faster event loop for the aiohttp server
+except ImportError:
+    uvloop = None
+
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+def _warmup():
+    """Parse the canister .did up front so the first add/call doesn't pay for it."""
+    try:
+        preload_did()
+    except Exception as error:
+        logger.warning("Warmup: could not preload canister interface: %s", error)
+
 async def main():
     api_server = ApiServer(host="0.0.0.0", port=8099)
 
@@ -21,9 +35,14 @@ async def main():
             # Platform (e.g., Windows) might not support this signal
             pass
 
+    await asyncio.to_thread(_warmup)
     await api_server.start()
     logger.info("API server started on port 8099")
 
+    # Startup objects (modules, parsed Candid, identity) live for the whole
+    # process; keep them out of every future GC pass.
+    gc.freeze()
+
     try:
         # Block here until a stop signal is received
         await stop_event.wait()
@@ -36,7 +55,7 @@ async def main():
     
 if __name__ == "__main__":
     try:
-        asyncio.run(main())
+        (uvloop.run if uvloop is not None else asyncio.run)(main())
     except KeyboardInterrupt:
         # Fallback if signals aren’t registered
         pass
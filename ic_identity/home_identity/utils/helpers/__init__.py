@@ -1,3 +1,4 @@
-from .candid_parser_helpers import strip_candid_comments, iter_balanced_blocks
+from .candid_parser_helpers import strip_candid_comments
+from .candid_tree_helpers import normalize_candid_tree
 
-__all__ = ["strip_candid_comments", "iter_balanced_blocks"]
\ No newline at end of file
+__all__ = ["strip_candid_comments", "normalize_candid_tree"]
\ No newline at end of file
@@ -0,0 +1,58 @@
+from collections import deque
+from typing import Any, Dict, Optional
+
+_CONTAINERS = (dict, list)
+
+
+def _principal_text(p: Any) -> str:
+    return p.to_str() if hasattr(p, "to_str") else str(p)
+
+
+def normalize_candid_tree(obj: Any, rename: Dict[str, str], principal_type: Optional[type] = None) -> Any:
+    """
+    Single iterative pass over a decoded Candid reply that:
+    - renames keys through `rename` (e.g. '_3535639105' -> 'contacts'),
+    - collapses unit variants like {'oneOnOne': None} into 'oneOnOne',
+    - replaces `principal_type` instances with their text form.
+    Containers are rebuilt rather than mutated, and an explicit worklist
+    keeps deep records clear of the recursion limit.
+
+    Kept free of class state and fully annotated so it can be compiled
+    (mypyc/Cython) as-is if the hot path ever needs it.
+    """
+    get = rename.get
+    leaf = principal_type or ()  # isinstance(x, ()) is always False
+    root = [obj]
+    work = deque([(root, 0)])
+    push, pop = work.append, work.pop
+    while work:
+        parent, key = pop()
+        node = parent[key]
+        if isinstance(node, dict):
+            if len(node) == 1:
+                (k, v), = node.items()
+                if v is None:
+                    parent[key] = get(k, k)
+                    continue
+            newd = {}
+            for k, v in node.items():
+                nk = get(k, k)
+                if isinstance(v, _CONTAINERS):
+                    newd[nk] = v
+                    push((newd, nk))
+                elif isinstance(v, leaf):
+                    newd[nk] = _principal_text(v)
+                else:
+                    newd[nk] = v
+            parent[key] = newd
+        elif isinstance(node, list):
+            newl = list(node)
+            for i, v in enumerate(newl):
+                if isinstance(v, _CONTAINERS):
+                    push((newl, i))
+                elif isinstance(v, leaf):
+                    newl[i] = _principal_text(v)
+            parent[key] = newl
+        elif isinstance(node, leaf):
+            parent[key] = _principal_text(node)
+    return root[0]
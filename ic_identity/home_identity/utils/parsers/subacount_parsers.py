@@ -1,7 +1,7 @@
 # subaccount_utils.py
 from __future__ import annotations
+from collections import deque
 from typing import Any
-import copy
 
 # --- core converters ---------------------------------------------------------
 
@@ -22,8 +22,12 @@ def _parse_opt_blob_to_hex(opt_blob: Any) -> str:
             # Fallback: do it nibble-by-nibble (faithful port of your JS)
             return parse_subaccount_to_text_py(blob)
     # If for some reason the blob already arrives as raw list-of-bytes:
-    if isinstance(opt_blob, list) and all(isinstance(x, int) for x in opt_blob):
-        return bytes(opt_blob).hex().upper()
+    # (bytes() rejects non-int / out-of-range items itself, no pre-scan needed)
+    if isinstance(opt_blob, list):
+        try:
+            return bytes(opt_blob).hex().upper()
+        except (TypeError, ValueError):
+            pass
     # Unknown shape — leave as-is (or return "")
     return ""
 
@@ -36,32 +40,76 @@ def parse_subaccount_to_text_py(value: list[int]) -> str:
 
 # --- tree transformer --------------------------------------------------------
 
-_SUBACCOUNT_KEYS = ("icpDefaultSubaccount", "businessDefaultSubaccount")
+_SUBACCOUNT_KEYS = frozenset(("icpDefaultSubaccount", "businessDefaultSubaccount"))
 
 def convert_subaccounts_inplace(obj: Any) -> None:
     """
     Walk a nested structure (dict/list) and convert any
     'icpDefaultSubaccount' / 'businessDefaultSubaccount' fields from
     [] or [[int,...]] to uppercase HEX strings. Mutates in place.
+    Uses an explicit stack, so deep payloads can't hit the recursion limit.
+    """
+    stack = deque([obj])
+    push, pop = stack.append, stack.pop
+    while stack:
+        node = pop()
+        if isinstance(node, dict):
+            for k, v in node.items():
+                if k in _SUBACCOUNT_KEYS:
+                    node[k] = _parse_opt_blob_to_hex(v)  # value swap only, keys unchanged
+                elif isinstance(v, (dict, list)):
+                    push(v)
+        elif isinstance(node, list):
+            stack.extend(v for v in node if isinstance(v, (dict, list)))
+
+def _items(node: Any) -> Any:
+    return iter(node.items()) if isinstance(node, dict) else enumerate(node)
+
+def _converted(root: Any) -> Any:
+    """
+    ``root`` with its subaccount fields converted, leaving ``root`` untouched.
+    Only the dicts/lists on the way to a subaccount field are copied; every
+    other container and value is shared with ``root`` (structural sharing),
+    so the two trees must not be mutated independently afterwards.
+    Uses an explicit stack, like convert_subaccounts_inplace.
     """
-    if isinstance(obj, dict):
-        for k, v in list(obj.items()):
-            if k in _SUBACCOUNT_KEYS:
-                obj[k] = _parse_opt_blob_to_hex(v)
-            else:
-                convert_subaccounts_inplace(v)
-    elif isinstance(obj, list):
-        for i in range(len(obj)):
-            convert_subaccounts_inplace(obj[i])
+    if not isinstance(root, (dict, list)):
+        return root
+    # Frames: [container, its (key, value) iterator, its copy or None, key in parent]
+    stack = [[root, _items(root), None, None]]
+    while True:
+        frame = stack[-1]
+        node = frame[0]
+        is_dict = isinstance(node, dict)
+        for k, v in frame[1]:
+            if is_dict and k in _SUBACCOUNT_KEYS:
+                if frame[2] is None:
+                    frame[2] = dict(node)
+                frame[2][k] = _parse_opt_blob_to_hex(v)
+            elif isinstance(v, (dict, list)):
+                stack.append([v, _items(v), None, k])
+                break  # resume this container once the child is done
+        else:
+            stack.pop()
+            new = node if frame[2] is None else frame[2]
+            if not stack:
+                return new
+            if new is not node:
+                parent = stack[-1]
+                if parent[2] is None:
+                    parent[2] = dict(parent[0]) if isinstance(parent[0], dict) else list(parent[0])
+                parent[2][frame[3]] = new
 
 def transform_login_result(data: Any, *, inplace: bool = False) -> Any:
     """
     Convert subaccount fields across the entire payload.
-    If inplace=False (default), returns a deep-copied transformed object.
+    If inplace=False (default), leaves ``data`` as it was and returns a new
+    tree that shares every container without subaccount fields with ``data``.
     """
-    target = data if inplace else copy.deepcopy(data)
-    convert_subaccounts_inplace(target)
-    return target
+    if not inplace:
+        return _converted(data)
+    convert_subaccounts_inplace(data)
+    return data
 
 # --- demo / example ----------------------------------------------------------
 
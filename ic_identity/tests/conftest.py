@@ -0,0 +1,36 @@
+import os
+import sys
+from pathlib import Path
+
+import pytest
+
+# The add-on runs as ``python -m home_identity.main`` from ic_identity/
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from home_identity.actor_controller import actor as actor_module  # noqa: E402
+from home_identity.identity import identity_manager as manager_module  # noqa: E402
+
+DATA = Path(__file__).resolve().parent / "data"
+
+LEDGER = "ryjl3-tyaaa-aaaaa-aaaba-cai"
+GOVERNANCE = "rrkah-fqaaa-aaaaa-aaaaq-cai"
+
+
+class _EphemeralKey:
+    """ICPrivateKey stand-in that never touches the mnemonic file."""
+
+    def __init__(self, regenerate: bool = False):
+        self.private_key = os.urandom(32)
+
+
+@pytest.fixture(autouse=True)
+def sample_did(monkeypatch):
+    monkeypatch.setattr(actor_module, "_DID_PATH", DATA / "sample.did")
+
+
+@pytest.fixture
+def make_manager(monkeypatch, tmp_path):
+    """Build IdentityManagers that share one DATA_DIR under tmp_path."""
+    monkeypatch.setenv("DATA_DIR", str(tmp_path))
+    monkeypatch.setattr(manager_module, "ICPrivateKey", _EphemeralKey)
+    return manager_module.IdentityManager
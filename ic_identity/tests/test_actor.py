@@ -0,0 +1,47 @@
+import re
+
+from ic.canister import Canister, CaniterMethod, CaniterMethodAsync
+
+from home_identity.actor_controller import actor as actor_module
+
+from conftest import DATA, LEDGER
+
+
+def _display(types):
+    # ic-py numbers recursive types from a process-wide counter (rec_0, rec_1, ...)
+    return [re.sub(r"rec_\d+", "rec", t.display()) for t in types]
+
+
+def _describe(method):
+    return (
+        type(method),
+        method.agent,
+        method.canister_id,
+        method.name,
+        _display(method.args),
+        _display(method.rets),
+        method.anno,
+    )
+
+
+def test_bind_canister_matches_canister_init():
+    """_bind_canister copies Canister.__init__; catch ic-py changing underneath it."""
+    source = (DATA / "sample.did").read_text()
+    agent = object()
+
+    expected = Canister(agent, LEDGER, candid=source)
+    bound = actor_module._bind_canister(agent, LEDGER, source, actor_module._parse_candid_actor(source))
+
+    assert type(bound) is Canister
+    assert vars(bound).keys() == vars(expected).keys()
+    assert (bound.agent, bound.canister_id, bound.candid) == (agent, LEDGER, source)
+    assert bound.actor["methods"].keys() == expected.actor["methods"].keys()
+    for name, value in vars(expected).items():
+        if isinstance(value, (CaniterMethod, CaniterMethodAsync)):
+            assert vars(getattr(bound, name)).keys() == vars(value).keys()
+            assert _describe(getattr(bound, name)) == _describe(value)
+
+
+def test_preload_did_warms_the_actor_cache():
+    did = actor_module.preload_did()
+    assert actor_module.load_did_metadata(DATA / "sample.did") is did
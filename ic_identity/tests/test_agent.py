@@ -0,0 +1,32 @@
+import os
+
+from ic.identity import Identity
+
+from home_identity.actor_controller import agent as agent_module
+from home_identity.actor_controller.agent import ICAgent
+
+
+def test_host_is_classified_once():
+    identity = Identity(os.urandom(32).hex())
+    assert ICAgent(identity, "http://127.0.0.1:4943")._is_local
+    assert not ICAgent(identity, "https://icp-api.io")._is_local
+    assert not ICAgent(identity)._is_local  # host defaults to None
+
+
+def test_agents_share_one_client_per_host(monkeypatch):
+    built = []
+    real_client = agent_module.PooledClient
+
+    def counting_client(url):
+        built.append(url)
+        return real_client(url=url)
+
+    monkeypatch.setattr(agent_module, "_CLIENTS", {})
+    monkeypatch.setattr(agent_module, "PooledClient", counting_client)
+    identity = Identity(os.urandom(32).hex())
+
+    first = ICAgent(identity, "https://icp-api.io")
+    second = ICAgent(Identity(os.urandom(32).hex()), "https://icp-api.io")
+
+    assert first.client is second.client
+    assert built == ["https://icp-api.io"]
@@ -0,0 +1,95 @@
+import gzip
+import json
+
+import pytest
+import pytest_asyncio
+from aiohttp.test_utils import TestClient, TestServer
+
+from home_identity.api.api import ApiServer, _accepts_gzip
+
+from conftest import LEDGER
+
+
+@pytest.mark.parametrize("header, expected", [
+    ("gzip", True),
+    ("gzip, deflate, br", True),
+    ("GZIP;q=0.5", True),
+    ("x-gzip", True),
+    ("*", True),
+    ("", False),
+    ("identity", False),
+    ("gzip;q=0", False),
+    ("gzip; q=0.0, deflate", False),
+    ("*;q=0", False),
+    ("gzip;q=0, *", False),
+    ("deflate, *;q=0.1", True),
+    ("gzip;q=bogus", False),
+])
+def test_accepts_gzip(header, expected):
+    assert _accepts_gzip(header) is expected
+
+
+@pytest_asyncio.fixture
+async def client(make_manager):
+    server = ApiServer("127.0.0.1", 0)
+    server._setup_web_routes()
+
+    async def boom(request):
+        raise RuntimeError("x" * 1000)
+
+    server.app.router.add_get("/boom", boom)
+    for i in range(40):
+        server.identity_manager.add_canister(LEDGER, f"canister_{i}")
+
+    async with TestClient(TestServer(server.app), auto_decompress=False) as test_client:
+        yield test_client
+
+
+@pytest.mark.asyncio
+async def test_large_reply_is_gzipped_when_accepted(client):
+    resp = await client.get(
+        "/api/v1/canisters", headers={"Origin": "http://ha.local", "Accept-Encoding": "gzip"}
+    )
+    assert resp.status == 200
+    assert resp.headers["Content-Encoding"] == "gzip"
+    # gzip runs outermost, so it extends the Vary that CORS set
+    assert resp.headers["Vary"] == "Origin, Accept-Encoding"
+    assert resp.headers["Access-Control-Allow-Origin"] == "http://ha.local"
+    assert b"canister_39" in gzip.decompress(await resp.read())
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("accept", ["identity", "gzip;q=0"])
+async def test_reply_is_not_gzipped_when_refused(client, accept):
+    resp = await client.get("/api/v1/canisters", headers={"Accept-Encoding": accept})
+    assert "Content-Encoding" not in resp.headers
+    assert b"canister_39" in await resp.read()
+
+
+@pytest.mark.asyncio
+async def test_small_reply_is_not_gzipped(client):
+    resp = await client.get("/api/v1/health", headers={"Accept-Encoding": "gzip"})
+    assert "Content-Encoding" not in resp.headers
+    assert await resp.read() == b'{"status": "up"}'
+
+
+@pytest.mark.asyncio
+async def test_errors_get_cors_headers_and_gzip(client):
+    resp = await client.get("/boom", headers={"Origin": "http://ha.local", "Accept-Encoding": "gzip"})
+    assert resp.status == 500
+    assert resp.headers["Access-Control-Allow-Origin"] == "http://ha.local"
+    assert resp.headers["Content-Encoding"] == "gzip"
+    assert json.loads(gzip.decompress(await resp.read()))["status"] == "error"
+
+
+@pytest.mark.asyncio
+async def test_preflight_short_circuits(client):
+    resp = await client.options(
+        "/api/v1/canisters/add",
+        headers={"Origin": "http://ha.local", "Access-Control-Request-Headers": "content-type"},
+    )
+    assert resp.status == 204
+    assert resp.headers["Access-Control-Allow-Origin"] == "http://ha.local"
+    assert resp.headers["Access-Control-Allow-Headers"] == "content-type"
+    assert resp.headers["Access-Control-Allow-Methods"] == "GET,POST,OPTIONS"
+    assert await resp.read() == b""
@@ -0,0 +1,133 @@
+import copy
+
+import pytest
+from ic.candid import Types, decode, encode
+from ic.principal import Principal
+
+from home_identity.actor_controller.actor import _candid_hash, load_did_metadata
+from home_identity.utils.helpers import normalize_candid_tree
+
+from conftest import DATA
+
+
+@pytest.fixture(scope="module")
+def rename():
+    return load_did_metadata(DATA / "sample.did").str_key_rename
+
+
+def _legacy_normalize(obj, rename):
+    """
+    The rehydrate -> unwrap -> principals passes ICActor ran before
+    normalize_candid_tree, kept here to pin the output against.
+    """
+    def rehydrate(o):
+        if isinstance(o, dict):
+            return {rename.get(k, k): rehydrate(v) for k, v in o.items()}
+        if isinstance(o, list):
+            return [rehydrate(x) for x in o]
+        return o
+
+    def unwrap(o):
+        if isinstance(o, dict):
+            if len(o) == 1:
+                (k, v), = o.items()
+                if v is None:
+                    o.clear()
+                    o["__unit__"] = k
+                    return
+            for key in list(o):
+                val = o[key]
+                unwrap(val)
+                if isinstance(val, dict) and "__unit__" in val and len(val) == 1:
+                    o[key] = val["__unit__"]
+        elif isinstance(o, list):
+            for x in o:
+                unwrap(x)
+
+    def principals(o):
+        if isinstance(o, dict):
+            for k, v in list(o.items()):
+                o[k] = principals(v)
+            return o
+        if isinstance(o, list):
+            for i, v in enumerate(o):
+                o[i] = principals(v)
+            return o
+        if isinstance(o, Principal):
+            return o.to_str()
+        return o
+
+    out = rehydrate(obj)
+    unwrap(out)
+    return principals(out)
+
+
+Contact = Types.Record({
+    "id": Types.Nat,
+    "icpDefaultSubaccount": Types.Opt(Types.Vec(Types.Nat8)),
+    "kind": Types.Variant({"oneOnOne": Types.Null, "group": Types.Null}),
+})
+LoginResult = Types.Variant({
+    "ok": Types.Record({"contacts": Types.Vec(Contact), "note": Types.Text}),
+    "err": Types.Text,
+})
+Conversations = Types.Vec(Types.Record({"id": Types.Nat, "owner": Types.Principal}))
+NestedOpt = Types.Opt(Types.Record({"note": Types.Opt(Types.Text)}))
+
+
+def _reply(candid_type, value):
+    """Decode like ic-py's query_raw/update_raw do: no types, hashed field names."""
+    return decode(encode([{"type": candid_type, "value": value}]))[0]["value"]
+
+
+REPLIES = {
+    "record_with_variants": (
+        _reply(LoginResult, {"ok": {
+            "contacts": [
+                {"id": 7, "icpDefaultSubaccount": [[96, 252]], "kind": {"group": None}},
+                {"id": 8, "icpDefaultSubaccount": [], "kind": {"oneOnOne": None}},
+            ],
+            "note": "x",
+        }}),
+        {"ok": {
+            "contacts": [
+                {"id": 7, "icpDefaultSubaccount": [[96, 252]], "kind": "group"},
+                {"id": 8, "icpDefaultSubaccount": [], "kind": "oneOnOne"},
+            ],
+            "note": "x",
+        }},
+    ),
+    "error_variant": (_reply(LoginResult, {"err": "denied"}), {"err": "denied"}),
+    "principals": (
+        _reply(Conversations, [{"id": 1, "owner": "aaaaa-aa"}, {"id": 2, "owner": "2vxsx-fae"}]),
+        [{"id": 1, "owner": "aaaaa-aa"}, {"id": 2, "owner": "2vxsx-fae"}],
+    ),
+    "nested_opt": (_reply(NestedOpt, [{"note": ["hi"]}]), [{"note": ["hi"]}]),
+    "empty_opt": (_reply(NestedOpt, []), []),
+}
+
+
+@pytest.mark.parametrize("name", sorted(REPLIES))
+def test_normalize_representative_replies(rename, name):
+    raw, expected = REPLIES[name]
+    before = copy.deepcopy(raw)
+
+    assert normalize_candid_tree(raw, rename, Principal) == expected
+    assert _legacy_normalize(copy.deepcopy(raw), rename) == expected
+    assert repr(raw) == repr(before)  # containers are rebuilt, never mutated
+
+
+def test_unknown_hashes_are_left_alone(rename):
+    raw = {f"_{_candid_hash('contacts')}": [], "_42": 1}
+    assert normalize_candid_tree(raw, rename) == {"contacts": [], "_42": 1}
+
+
+def test_unit_variants_in_lists_and_at_root_are_collapsed(rename):
+    # The legacy unwrap only collapsed units held by a dict and leaked its
+    # "__unit__" marker everywhere else; normalize_candid_tree collapses them all.
+    group = f"_{_candid_hash('group')}"
+    raw = [{group: None}, {"kind": {group: None}}]
+
+    assert _legacy_normalize(copy.deepcopy(raw), rename) == [{"__unit__": "group"}, {"kind": "group"}]
+    assert normalize_candid_tree(raw, rename) == ["group", {"kind": "group"}]
+    assert normalize_candid_tree({group: None}, rename) == "group"
@@ -0,0 +1,288 @@
+import asyncio
+import json
+import os
+import threading
+import time
+
+import pytest
+
+from home_identity.identity import StalePreconditionError
+from home_identity.identity import identity_manager as manager_module
+
+from conftest import GOVERNANCE, LEDGER
+
+
+def _rewrite_externally(tmp_path, canisters, seq=0):
+    path = tmp_path / "canisters" / "canisters.json"
+    path.parent.mkdir(exist_ok=True)
+    path.write_text(json.dumps({"canisters": canisters, "seq": seq}))
+
+
+def test_registry_survives_restart(make_manager):
+    manager = make_manager()
+    manager.add_canister(LEDGER, "a")
+    manager.add_canister(GOVERNANCE, "b")
+    manager.delete_canister("a")
+
+    assert make_manager().list_canisters() == ["b"]
+
+
+def test_external_rewrite_is_adopted_and_reported(make_manager, tmp_path):
+    manager = make_manager()
+    manager.add_canister(LEDGER, "a")
+    manager.add_canister(LEDGER, "b")
+    manager.delete_canister("a")
+    identity = manager.identity
+
+    _rewrite_externally(tmp_path, {"ext": GOVERNANCE})
+    with pytest.raises(StalePreconditionError):
+        manager.regenerate_identity()
+
+    # The other writer's file wins and nothing was cleared or rotated
+    assert manager.list_canisters() == ["ext"]
+    assert manager.identity is identity
+    assert (tmp_path / "canisters" / "journal.jsonl").read_bytes() == b""
+
+    # Later writes work again and extend the adopted snapshot
+    manager.add_canister(LEDGER, "c")
+    assert sorted(make_manager().list_canisters()) == ["c", "ext"]
+
+    manager.delete_canister("ext")
+    assert make_manager().list_canisters() == ["c"]
+
+
+def test_journal_append_checks_precondition(make_manager, tmp_path):
+    manager = make_manager()
+    manager.add_canister(LEDGER, "a")
+
+    _rewrite_externally(tmp_path, {"ext": GOVERNANCE}, seq=7)
+    with pytest.raises(StalePreconditionError):
+        manager.add_canister(GOVERNANCE, "b")
+
+    assert manager.list_canisters() == ["ext"]
+    manager.add_canister(GOVERNANCE, "b")
+    assert sorted(make_manager().list_canisters()) == ["b", "ext"]
+
+
+def test_failed_append_leaves_registry_untouched(make_manager, monkeypatch):
+    manager = make_manager()
+    manager.add_canister(LEDGER, "a")
+
+    write_all = manager_module._write_all
+
+    def torn_write(fd, data):
+        os.write(fd, data[:len(data) // 2])
+        raise OSError("disk full")
+
+    monkeypatch.setattr(manager_module, "_write_all", torn_write)
+    with pytest.raises(OSError):
+        manager.add_canister(GOVERNANCE, "b")
+    with pytest.raises(OSError):
+        manager.delete_canister("a")
+
+    assert manager.list_canisters() == ["a"]
+    assert make_manager().list_canisters() == ["a"]
+
+    # The torn line was cut off, so the next entry replays cleanly
+    monkeypatch.setattr(manager_module, "_write_all", write_all)
+    manager.add_canister(GOVERNANCE, "b")
+    assert sorted(make_manager().list_canisters()) == ["a", "b"]
+
+
+def test_failed_snapshot_changes_nothing(make_manager, monkeypatch, tmp_path):
+    manager = make_manager()
+    manager.add_canister(LEDGER, "a")
+    identity = manager.identity
+
+    def failing_write(fd, data):
+        raise OSError("disk full")
+
+    monkeypatch.setattr(manager_module, "_write_all", failing_write)
+    with pytest.raises(OSError):
+        manager.regenerate_identity()
+
+    assert manager.list_canisters() == ["a"]
+    assert manager.identity is identity
+    assert make_manager().list_canisters() == ["a"]
+    assert not list((tmp_path / "canisters").glob("*.tmp"))
+
+
+def test_snapshot_leaves_other_writers_temp_files(make_manager, tmp_path):
+    manager = make_manager()
+    foreign = tmp_path / "canisters" / "canisters.json.tmp"
+    foreign.write_text("{}")
+
+    manager.regenerate_identity()
+
+    assert foreign.read_text() == "{}"
+    assert list((tmp_path / "canisters").glob("*.tmp")) == [foreign]
+
+
+def test_failed_compaction_keeps_changes(make_manager, monkeypatch, tmp_path):
+    monkeypatch.setattr(manager_module, "_JOURNAL_COMPACT_LINES", 2)
+    manager = make_manager()
+    write_canisters = manager._write_canisters
+
+    def failing(payload):
+        raise OSError("disk full")
+
+    monkeypatch.setattr(manager, "_write_canisters", failing)
+    manager.add_canister(LEDGER, "a")
+    manager.add_canister(GOVERNANCE, "b")  # compaction fails, the change stands
+    assert sorted(make_manager().list_canisters()) == ["a", "b"]
+
+    monkeypatch.setattr(manager, "_write_canisters", write_canisters)
+    manager.delete_canister("a")  # retried here
+    assert (tmp_path / "canisters" / "journal.jsonl").read_bytes() == b""
+    assert make_manager().list_canisters() == ["b"]
+
+
+def test_add_canisters_writes_once(make_manager, monkeypatch):
+    manager = make_manager()
+    appends = []
+    append_journal = manager._append_journal
+
+    def counting_append(lines):
+        appends.append(lines)
+        append_journal(lines)
+
+    monkeypatch.setattr(manager, "_append_journal", counting_append)
+
+    assert manager.add_canisters([(LEDGER, "a"), (GOVERNANCE, "b"), (LEDGER, None)]) == 3
+
+    assert len(appends) == 1 and len(appends[0]) == 3
+    assert sorted(make_manager().list_canisters()) == ["a", "b", LEDGER]
+
+
+def test_add_canisters_is_all_or_nothing(make_manager, monkeypatch):
+    manager = make_manager()
+    with pytest.raises(ValueError, match="Invalid canister_id"):
+        manager.add_canisters([(LEDGER, "a"), ("not a canister", "b")])
+    assert manager.list_canisters() == []
+
+    def failing_write(fd, data):
+        raise OSError("disk full")
+
+    monkeypatch.setattr(manager_module, "_write_all", failing_write)
+    with pytest.raises(OSError):
+        manager.add_canisters([(LEDGER, "a"), (GOVERNANCE, "b")])
+    assert manager.list_canisters() == []
+    assert manager._actors == {}
+    assert make_manager().list_canisters() == []
+
+
+def test_regenerate_waits_for_actor_being_built(make_manager, monkeypatch):
+    manager = make_manager()
+    building = threading.Event()
+    real_actor = manager_module.ICActor
+
+    def slow_actor(agent, canister_id):
+        building.set()
+        time.sleep(0.1)
+        return real_actor(agent, canister_id)
+
+    monkeypatch.setattr(manager_module, "ICActor", slow_actor)
+    adder = threading.Thread(target=manager.add_canister, args=(LEDGER, "a"))
+    adder.start()
+    building.wait()
+    manager.regenerate_identity()
+    adder.join()
+
+    # The add finished first and was cleared; no actor for the old identity survives
+    assert manager.list_canisters() == []
+    assert manager._actors == {}
+
+    manager.add_canister(LEDGER, "a")
+    assert manager.get_canister_actor("a").agent is manager._agent
+
+
+@pytest.mark.asyncio
+async def test_call_builds_actor_off_the_event_loop(make_manager, monkeypatch):
+    manager = make_manager()
+    manager.add_canister(LEDGER, "a")
+    manager._actors.clear()
+    threads = []
+
+    async def call_method(self, method_name, args):
+        return method_name
+
+    def get_actor(canister_name):
+        threads.append(threading.current_thread())
+        return manager_module.IdentityManager.get_canister_actor(manager, canister_name)
+
+    monkeypatch.setattr(manager_module.ICActor, "call_method", call_method)
+    monkeypatch.setattr(manager, "get_canister_actor", get_actor)
+
+    assert await manager.call_canister_method("a", "greet") == "greet"
+    assert threads and threads[0] is not threading.main_thread()
+
+
+@pytest.mark.asyncio
+async def test_call_canister_methods_keeps_order_and_errors(make_manager, monkeypatch):
+    manager = make_manager()
+    manager.add_canister(LEDGER, "a")
+    manager.add_canister(GOVERNANCE, "b")
+
+    async def call_method(self, method_name, args):
+        await asyncio.sleep(args[0])  # finish in reverse order
+        return (self.canister_id, method_name)
+
+    monkeypatch.setattr(manager_module.ICActor, "call_method", call_method)
+
+    results = await manager.call_canister_methods([
+        ("a", "first", [0.03]),
+        ("missing", "second", [0]),
+        ("b", "third", [0]),
+    ])
+
+    assert results[0] == (LEDGER, "first")
+    assert isinstance(results[1], ValueError)
+    assert results[2] == (GOVERNANCE, "third")
+
+
+# Self-authenticating principal (Ed25519 key 0x11 * 32): the longest textual form
+USER_PRINCIPAL = "r772c-4dz5f-rpg4e-qzxgg-7bxlb-67zpu-bitgb-vsx7k-mmagd-6zk3d-4qe"
+
+
+@pytest.mark.parametrize("value", [LEDGER, GOVERNANCE, "aaaaa-aa", "2vxsx-fae", USER_PRINCIPAL])
+def test_canister_id_accepted(value):
+    assert manager_module._is_canister_id(value)
+
+
+@pytest.mark.parametrize("value", [
+    "",
+    "RYJL3-TYAAA-AAAAA-AAABA-CAI",   # base32 text is lower-case
+    "ryjl3_tyaaa-aaaaa-aaaba-cai",
+    "ryjl3-tyaaa-aaaaa-aaaba-ca1",   # 0, 1, 8, 9 are not base32
+    "ryjl3--tyaaa",
+    "ryjl3-tyaaa-",
+    "-ryjl3",
+    " ryjl3-tyaaa-aaaaa-aaaba-cai",
+    "ryjl3-tyaaa-aaaaa-aaaba-cai\n",
+    "ryjl3tyaaa",                    # groups are at most 5 chars
+    USER_PRINCIPAL + "-aaaaa",       # longer than any principal
+    None,
+    12345,
+])
+def test_canister_id_rejected(value):
+    assert not manager_module._is_canister_id(value)
+
+
+def test_add_canister_rejects_invalid_ids(make_manager):
+    manager = make_manager()
+    with pytest.raises(ValueError, match="required"):
+        manager.add_canister("", "a")
+    with pytest.raises(ValueError, match="Invalid canister_id"):
+        manager.add_canister("not a canister", "a")
+    assert manager.list_canisters() == []
+
+
+def test_invalid_ids_on_disk_are_dropped(make_manager, tmp_path):
+    _rewrite_externally(tmp_path, {"good": LEDGER, "bad": "NOT-AN-ID"}, seq=1)
+    journal = tmp_path / "canisters" / "journal.jsonl"
+    journal.write_text(
+        json.dumps({"seq": 2, "name": "worse", "op": "add", "id": "x y"}) + "\n"
+        + json.dumps({"seq": 3, "name": "fine", "op": "add", "id": GOVERNANCE}) + "\n"
+    )
+
+    assert sorted(make_manager().list_canisters()) == ["fine", "good"]
@@ -0,0 +1,65 @@
+import copy
+from datetime import datetime
+
+from home_identity.utils.parsers.subacount_parsers import transform_login_result
+
+
+def _payload():
+    return {
+        "status": "success",
+        "when": datetime(2024, 1, 2, 3, 4, 5),
+        "result": [{
+            "type": "rec_129",
+            "value": {"ok": {"contacts": [{
+                "id": 2 ** 80,
+                "pair": (1, 2),
+                "icpDefaultSubaccount": [[96, 252, 6, 143]],
+                "businessDefaultSubaccount": [],
+            }]}},
+        }],
+        "untouched": {"ratio": float("nan"), "tags": ("a", "b")},
+    }
+
+
+def test_copy_converts_subaccounts_and_leaves_input_alone():
+    data = _payload()
+    before = copy.deepcopy(data)
+
+    out = transform_login_result(data)
+
+    contact = out["result"][0]["value"]["ok"]["contacts"][0]
+    assert contact["icpDefaultSubaccount"] == "60FC068F"
+    assert contact["businessDefaultSubaccount"] == ""
+    # Values keep their Python types (no JSON round-trip)
+    assert contact["id"] == 2 ** 80
+    assert contact["pair"] == (1, 2)
+    assert out["when"] == datetime(2024, 1, 2, 3, 4, 5)
+    assert out["untouched"] is data["untouched"]
+
+    assert data["result"][0]["value"]["ok"]["contacts"][0]["icpDefaultSubaccount"] == [[96, 252, 6, 143]]
+    assert repr(data) == repr(before)
+
+
+def test_inplace_matches_copy():
+    assert repr(transform_login_result(_payload(), inplace=True)) == repr(transform_login_result(_payload()))
+
+
+def test_payload_without_subaccounts_is_returned_as_is():
+    data = {"ok": [{"id": 1}, (1, 2)]}
+    assert transform_login_result(data) is data
+
+
+def test_deep_payload_does_not_recurse():
+    data = inner = {}
+    for _ in range(5000):
+        inner["next"] = [{}]
+        inner = inner["next"][0]
+    inner["icpDefaultSubaccount"] = [[1]]
+
+    out = transform_login_result(data)
+
+    node = out
+    for _ in range(5000):
+        node = node["next"][0]
+    assert node["icpDefaultSubaccount"] == "01"
+    assert inner["icpDefaultSubaccount"] == [[1]]